@@ -1,12 +1,21 @@
 import warnings
 import logging
 import os, sys, shutil, json, zipfile, re, time, datetime as dt
+import struct, zlib
+import threading, queue
+import atexit
+from logging.handlers import QueueHandler, QueueListener
 from urllib3.exceptions import InsecureRequestWarning
-from joblib import Parallel, delayed, parallel_backend
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from delete_fgdb_agol import *
 
 from arcgis.gis import GIS
 import urllib3
+
+try:
+    import deflate  # libdeflate bindings — optional, noticeably faster DEFLATE
+except ImportError:
+    deflate = None
 # =========================================================
 # CONFIGURATION
 # =========================================================
@@ -30,30 +39,121 @@ load_dotenv(dotenv_path=env_path, override=True)
 
 
 LOG_FILE = "agol_backup.log"
-logging.basicConfig(
-    filename=LOG_FILE,
-    filemode="w",   # ✅ overwrite instead of append
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-)
-
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logging.getLogger().addHandler(console)
+_log_listener = None
+
+
+def setup_logging(log_file=LOG_FILE):
+    """Configure root logging once: queue-fed file + console handlers.
+
+    Worker threads only enqueue log records; a background QueueListener does
+    the file/console I/O. Calling this again is a no-op, so modules that
+    also configure logging when run standalone can't stack duplicate
+    handlers (which would emit every line twice).
+    """
+    global _log_listener
+    if _log_listener is not None or logging.getLogger().handlers:
+        return
+
+    fmt = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler = logging.FileHandler(log_file, mode="w")   # ✅ overwrite instead of append
+    file_handler.setFormatter(fmt)
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.INFO)
+    console.setFormatter(fmt)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # QueueHandler.prepare() pre-formats each record with this handler's
+    # formatter before it reaches the listener. Without an explicit
+    # pass-through, basicConfig assigns its levelname:name: default and every
+    # line comes out double-prefixed once the listener's handlers format it.
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    _log_listener = QueueListener(log_queue, file_handler, console)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+
+setup_logging()
 
 # Folders
 LOCAL_TEMP_FOLDER = r"E:\AGOL_BACKUP_15DAYS"  # <— faster SSD temp workspace
 os.makedirs(LOCAL_TEMP_FOLDER, exist_ok=True)
 
+# Export/download is network-bound (AGOL export polling + HTTPS download),
+# so the thread count is independent of CPU cores. Override via .env if AGOL
+# starts rate-limiting.
+MAX_THREADS = int(os.getenv("AGOL_MAX_THREADS", 32))
+
+# FGDB exports are mostly pre-compressed internally, so heavy deflate buys
+# almost nothing. 0 = store uncompressed, 1-9 = deflate level (default: fastest).
+ZIP_LEVEL = int(os.getenv("AGOL_ZIP_LEVEL", 1))
+
+
+def tune_thread_count(gis, expected_items=700):
+    """Size the worker pool from measured AGOL latency, not CPU count.
+
+    Little's law: the concurrency needed to finish `expected_items` tasks in
+    a target wall time is items × per-task seconds / target seconds. A
+    1-item search stands in as the RTT probe; a per-item export+download is
+    assumed to cost roughly 10 RTTs. The probe can only scale the pool *up*
+    from the MAX_THREADS default — a fast search says nothing about how slow
+    the AGOL-side export jobs are, so it must never shrink the pool below
+    the known-good baseline. An explicit AGOL_MAX_THREADS wins outright.
+    """
+    if os.getenv("AGOL_MAX_THREADS"):
+        return MAX_THREADS
+
+    t0 = time.perf_counter()
+    try:
+        gis.content.search(query="type:'Feature Service'", max_items=1)
+    except Exception as e:
+        logging.warning("⚠️ Latency probe failed, keeping default thread count: %s", e)
+        return MAX_THREADS
+    rtt = time.perf_counter() - t0
+
+    target_wall_s = float(os.getenv("AGOL_TARGET_WALL_S", 600))
+    avg_task_s = rtt * 10
+    n_threads = min(64, max(MAX_THREADS, int(expected_items * avg_task_s / target_wall_s)))
+    logging.info(
+        "📐 Probe RTT %.2fs → est. %.1fs/item → %d threads for %d items / %.0fs target",
+        rtt, avg_task_s, n_threads, expected_items, target_wall_s
+    )
+    return n_threads
+
+
+def widen_connection_pool(gis, pool_size):
+    """Match the requests connection pool to the thread count so workers
+    don't stall waiting for a free HTTPS connection.
+
+    The pool is rebuilt on the adapters the arcgis API already mounted —
+    swapping in a fresh HTTPAdapter would discard its retry/TLS setup.
+    """
+    try:
+        session = gis._con._session
+        for prefix in ("https://", "http://"):
+            adapter = session.get_adapter(prefix)
+            adapter._pool_connections = pool_size
+            adapter._pool_maxsize = pool_size
+            adapter.init_poolmanager(pool_size, pool_size,
+                                     block=adapter._pool_block)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not widen HTTP connection pool: {e}")
+
 
 # =========================================================
 # HELPERS
 # =========================================================
+# Compiled once at import — safe_filename runs once per item per run.
+_UNSAFE_CHARS = re.compile(r'[<>:"/\\|?*()\'’]')
+_WHITESPACE = re.compile(r'\s+')
+
+
 def safe_filename(name):
     """Clean ArcGIS item titles for safe Windows file/folder naming."""
-    name = re.sub(r'[<>:"/\\|?*()\'’]', "_", name)
-    name = re.sub(r'\s+', "_", name.strip())
+    name = _UNSAFE_CHARS.sub("_", name)
+    name = _WHITESPACE.sub("_", name.strip())
     return name[:80]
 
 
@@ -64,56 +164,274 @@ def create_daily_folder(base_folder):
     return folder_path
 
 
+def libdeflate_zip(folder, out_path, level):
+    """Zip a folder using libdeflate instead of zlib.
+
+    The output is a standard DEFLATE zip readable by any tool; the local
+    headers and central directory are written by hand because zipfile has
+    no public way to accept pre-compressed member data.
+    """
+    entries = []
+    with open(out_path, "wb") as out:
+        for root, _, files in os.walk(folder):
+            for f in files:
+                full = os.path.join(root, f)
+                arc = os.path.relpath(full, os.path.dirname(folder)).replace(os.sep, "/")
+                if os.path.getsize(full) >= 0xFFFFFFFF:
+                    raise ValueError(f"{full} is too large for a non-zip64 member")
+                with open(full, "rb") as src:
+                    data = src.read()
+                crc = zlib.crc32(data)
+                cdata = deflate.deflate_compress(data, level)
+                if len(cdata) >= 0xFFFFFFFF:
+                    raise ValueError(f"{full} compressed past the non-zip64 limit")
+                mtime = time.localtime(os.path.getmtime(full))
+                dos_time = (mtime.tm_hour << 11) | (mtime.tm_min << 5) | (mtime.tm_sec // 2)
+                dos_date = ((mtime.tm_year - 1980) << 9) | (mtime.tm_mon << 5) | mtime.tm_mday
+                name = arc.encode("utf-8")
+                offset = out.tell()
+                out.write(struct.pack("<4s5H3I2H", b"PK\x03\x04", 20, 0x800, 8,
+                                      dos_time, dos_date, crc, len(cdata), len(data),
+                                      len(name), 0))
+                out.write(name)
+                out.write(cdata)
+                entries.append((name, dos_time, dos_date, crc, len(cdata), len(data), offset))
+        cd_start = out.tell()
+        for name, dos_time, dos_date, crc, csize, usize, offset in entries:
+            out.write(struct.pack("<4s6H3I5H2I", b"PK\x01\x02", 20, 20, 0x800, 8,
+                                  dos_time, dos_date, crc, csize, usize,
+                                  len(name), 0, 0, 0, 0, 0, offset))
+            out.write(name)
+        cd_size = out.tell() - cd_start
+        out.write(struct.pack("<4s4H2IH", b"PK\x05\x06", 0, 0,
+                              len(entries), len(entries), cd_size, cd_start, 0))
+
+
+def stdlib_zip(folder, out_path):
+    """Zip a folder with the stdlib zipfile module."""
+    compression = zipfile.ZIP_STORED if ZIP_LEVEL == 0 else zipfile.ZIP_DEFLATED
+    base = os.path.dirname(folder)
+    with zipfile.ZipFile(out_path, "w", compression,
+                         compresslevel=ZIP_LEVEL or None) as zipf:
+        for root, _, files in os.walk(folder):
+            for f in files:
+                full = os.path.join(root, f)
+                arc = os.path.relpath(full, base)
+                # Stream in 1 MiB chunks instead of ZipFile.write's 8 KiB —
+                # multi-GB .gdbtable shards are disk-bandwidth bound. zip64 is
+                # forced so members near the 4 GiB limit never truncate
+                # mid-stream.
+                zinfo = zipfile.ZipInfo.from_file(full, arc)
+                zinfo.compress_type = compression
+                # ZipFile.open ignores the archive-level compresslevel when
+                # handed a ZipInfo — it reads the level off the zinfo itself.
+                zinfo._compresslevel = ZIP_LEVEL or None
+                with open(full, "rb", buffering=1 << 20) as src, \
+                        zipf.open(zinfo, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, length=1 << 20)
+
+
+def _largest_member(folder):
+    """Return the size of the biggest file under folder."""
+    largest = 0
+    for root, _, files in os.walk(folder):
+        for f in files:
+            try:
+                largest = max(largest, os.path.getsize(os.path.join(root, f)))
+            except OSError:
+                pass
+    return largest
+
+
+def zip_folder(folder, out_path):
+    """Zip a folder, preferring libdeflate when the binding is installed.
+
+    libdeflate compresses each member in one shot in memory, so folders with
+    a multi-GB shard go straight to the streaming stdlib writer instead of
+    reading gigabytes only to hit the zip64 guard and re-zip everything.
+    """
+    if deflate is not None and ZIP_LEVEL > 0 and _largest_member(folder) < 0xFFFFFFFF:
+        try:
+            libdeflate_zip(folder, out_path, ZIP_LEVEL)
+            return
+        except Exception as e:
+            logging.warning(f"⚠️ libdeflate zip failed for {folder}, using zipfile: {e}")
+    stdlib_zip(folder, out_path)
+
+
+def rmtree_fast(path):
+    """Delete a directory tree bottom-up with os.walk; return True if gone.
+
+    Avoids shutil.rmtree's repeated listdir/re-stat pattern, which degrades
+    quadratically on daily folders holding hundreds of extracted FGDB trees.
+    Individual unlink/rmdir errors are tolerated (the final existence check
+    catches anything that survived, e.g. a junction the walk can't descend).
+    """
+    for root, dirs, files in os.walk(path, topdown=False):
+        for f in files:
+            try:
+                os.unlink(os.path.join(root, f))
+            except OSError:
+                pass
+        for d in dirs:
+            try:
+                os.rmdir(os.path.join(root, d))
+            except OSError:
+                pass
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+    return not os.path.exists(path)
+
+
 def cleanup_old_folders(base_folder, days=15):
     cutoff = dt.datetime.now() - dt.timedelta(days=days)
-    if not os.path.exists(base_folder):
+
+    # scandir caches is_dir/stat from the directory walk itself — one syscall
+    # per folder instead of three.
+    old_paths = []
+    try:
+        with os.scandir(base_folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False) and \
+                            dt.datetime.fromtimestamp(entry.stat().st_mtime) < cutoff:
+                        old_paths.append(entry.path)
+                except Exception as e:
+                    logging.warning(f"⚠️ Could not check {entry.path}: {e}")
+    except FileNotFoundError:
+        return
+
+    if not old_paths:
         return
-    for f in os.listdir(base_folder):
-        path = os.path.join(base_folder, f)
-        if os.path.isdir(path):
-            try:
-                if dt.datetime.fromtimestamp(os.path.getmtime(path)) < cutoff:
-                    shutil.rmtree(path)
-                    logging.info(f"🗑️ Deleted old folder: {path}")
-            except Exception as e:
-                logging.warning(f"⚠️ Could not delete {path}: {e}")
+
+    # rmtree releases the GIL inside unlink/rmdir syscalls, so deleting the
+    # old daily folders in parallel is safe and much faster.
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        deleted = list(pool.map(rmtree_fast, old_paths))
+    for path, gone in zip(old_paths, deleted):
+        if gone:
+            logging.info("🗑️ Deleted old folder: %s", path)
+        else:
+            logging.warning("⚠️ Could not delete %s", path)
 
 # =========================================================
 # EXPORT FEATURE SERVICE
 # =========================================================
-def export_feature_service(fs_id, fs_title, temp_folder, version, gis):
-    """Export one hosted layer, download to temp, skip if already exists."""
+MANIFEST_NAME = "manifest.json"
+_manifest_lock = threading.Lock()
+
+
+def load_manifest(temp_folder):
+    """Load the sidecar manifest of completed exports (item id → zip info)."""
+    path = os.path.join(temp_folder, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def record_in_manifest(fs_id, final_zip_path, manifest):
+    """Record one completed export in manifest.json (thread-safe).
+
+    The manifest makes resume-after-crash a dict lookup instead of trusting
+    whatever file names happen to exist in the daily folder.
+    """
+    if manifest is None or fs_id is None:
+        return
+    temp_folder = os.path.dirname(final_zip_path)
+    entry = {
+        "zip": os.path.basename(final_zip_path),
+        "size": os.path.getsize(final_zip_path),
+        "mtime": os.path.getmtime(final_zip_path),
+    }
+    with _manifest_lock:
+        manifest[fs_id] = entry
+        tmp = os.path.join(temp_folder, MANIFEST_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(temp_folder, MANIFEST_NAME))
+
+
+def repackage(fgdb_path, final_zip_path, fs_title, scratch_dir=None,
+              fs_id=None, manifest=None):
+    """Zip a downloaded FGDB folder and drop the source tree.
+
+    The zip is built inside the scratch area and moved into place with
+    os.replace, so a crash mid-zip never leaves a half-written file at the
+    canonical path.
+    """
+    try:
+        tmp_zip = fgdb_path.rstrip("/\\") + ".zip"
+        zip_folder(fgdb_path, tmp_zip)
+        os.replace(tmp_zip, final_zip_path)
+        shutil.rmtree(scratch_dir if scratch_dir is not None else fgdb_path,
+                      ignore_errors=True)
+        record_in_manifest(fs_id, final_zip_path, manifest)
+        logging.info("📦 Repackaged %s → %s", fs_title, final_zip_path)
+        return True
+    except Exception as e:
+        logging.error("❌ Error repackaging %s: %s", fs_title, e)
+        return False
+
+
+def repackage_worker(zip_queue, failures):
+    """Drain (fgdb_path, zip_path, title, scratch_dir, fs_id, manifest)
+    tasks until a None sentinel, collecting failed titles in `failures`."""
+    while True:
+        task = zip_queue.get()
+        if task is None:
+            break
+        if not repackage(*task):
+            failures.append(task[2])
+        zip_queue.task_done()
+
+
+def export_feature_service(fs_id, fs_title, temp_folder, version, gis,
+                           zip_queue=None, existing=None, manifest=None):
+    """Export one hosted layer, download to temp, skip if already exists.
+
+    `existing` is the set of entry names already in temp_folder, listed once
+    by the caller — a set lookup per item instead of 1-2 stat calls.
+    `manifest` is the dict loaded from manifest.json; completed item ids are
+    skipped and new completions are recorded there.
+    """
     start = dt.datetime.now()
     safe_title = safe_filename(fs_title)
     backup_filename = f"{safe_title}_Backup_{version}"
 
-    expected_zip_1 = os.path.join(temp_folder, backup_filename + ".zip")
-    expected_zip_2 = os.path.join(temp_folder, backup_filename + ".gdb.zip")
-    expected_folder = os.path.join(temp_folder, backup_filename)
+    scratch_dir = os.path.join(temp_folder, ".scratch_" + backup_filename)
 
     # =========================================================
     # 1️⃣ Skip if the ZIP already exists
     # =========================================================
-    if os.path.exists(expected_zip_1) or os.path.exists(expected_zip_2):
-        logging.info(f"⏭️ Skipping (already backed up): {fs_title}")
+    if manifest is not None and fs_id in manifest:
+        logging.info("⏭️ Skipping (in manifest): %s", fs_title)
+        return f"Skipped: {fs_title}"
+    if existing is None:
+        existing = set(os.listdir(temp_folder))
+    if (backup_filename + ".zip") in existing or (backup_filename + ".gdb.zip") in existing:
+        logging.info("⏭️ Skipping (already backed up): %s", fs_title)
         return f"Skipped: {fs_title}"
 
     # =========================================================
-    # 2️⃣ If a leftover folder exists from a previous crash → delete it
+    # 2️⃣ If a scratch dir is left over from a previous crash → delete it
     # =========================================================
-    if os.path.isdir(expected_folder):
-        logging.warning(f"⚠️ Removing incomplete leftover folder: {expected_folder}")
+    if os.path.basename(scratch_dir) in existing and os.path.isdir(scratch_dir):
+        logging.warning("⚠️ Removing incomplete leftover scratch: %s", scratch_dir)
         try:
-            shutil.rmtree(expected_folder)
+            shutil.rmtree(scratch_dir)
         except Exception as e:
-            logging.error(f"❌ Could not remove leftover folder {expected_folder}: {e}")
+            logging.error("❌ Could not remove leftover scratch %s: %s", scratch_dir, e)
 
     try:
         feature_service = gis.content.get(fs_id)
         if not feature_service:
             raise ValueError("Item not found")
 
-        logging.info(f"🚀 Exporting: {fs_title}")
+        logging.info("🚀 Exporting: %s", fs_title)
 
         # Export to AGOL
         export_item = feature_service.export(
@@ -121,47 +439,75 @@ def export_feature_service(fs_id, fs_title, temp_folder, version, gis):
             export_format="File Geodatabase"
         )
 
-        # Download
-        fgdb_path = export_item.download(save_path=temp_folder)
-
-        # Handle AGOL returning folder instead of zip
-        final_zip_path = fgdb_path
-        if not final_zip_path.lower().endswith(".zip"):
-            # Compress folder manually
-            final_zip_path = fgdb_path + ".zip"
-            with zipfile.ZipFile(final_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(fgdb_path):
-                    for f in files:
-                        full = os.path.join(root, f)
-                        arc = os.path.relpath(full, os.path.dirname(fgdb_path))
-                        zipf.write(full, arc)
+        # Download into a per-item scratch dir; finished files are moved to
+        # the daily folder with os.replace, so anything half-written stays
+        # confined to the scratch area.
+        os.makedirs(scratch_dir, exist_ok=True)
+        fgdb_path = export_item.download(save_path=scratch_dir)
 
-            shutil.rmtree(fgdb_path)
+        # The AGOL-side export item is dead weight once downloaded — delete
+        # it now instead of leaving it for a second search-and-delete pass.
+        # A failed delete is not an export failure; the cleanup safety net
+        # will catch it.
+        try:
+            export_item.delete(permanent=True)
+        except Exception as e:
+            logging.warning("⚠️ Could not delete AGOL export item for %s: %s", fs_title, e)
+
+        # Handle AGOL returning a folder instead of a zip. Check the path type
+        # directly — a suffix test would walk a regular file that merely lacks
+        # a .zip extension (e.g. a .gdb.zip renamed by the portal).
+        queued = False
+        if os.path.isdir(fgdb_path):
+            final_zip_path = os.path.join(temp_folder, backup_filename + ".zip")
+            if zip_queue is not None:
+                # Hand the disk/CPU-bound zip to the repackager threads so
+                # this worker can start on the next download immediately.
+                zip_queue.put((fgdb_path, final_zip_path, fs_title, scratch_dir,
+                               fs_id, manifest))
+                queued = True
+            else:
+                if not repackage(fgdb_path, final_zip_path, fs_title, scratch_dir,
+                                 fs_id, manifest):
+                    return None
+        else:
+            final_zip_path = os.path.join(temp_folder, os.path.basename(fgdb_path))
+            os.replace(fgdb_path, final_zip_path)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            record_in_manifest(fs_id, final_zip_path, manifest)
 
         end = dt.datetime.now()
-        logging.info(
-            f"✅ Exported {fs_title} → {final_zip_path} "
-            f"({(end-start).total_seconds():.1f}s)"
-        )
+        if queued:
+            # The zip doesn't exist yet — the summary settles the final count
+            # once the repackager threads drain.
+            logging.info(
+                "⬇️ Downloaded %s, re-zip queued → %s (%.1fs)",
+                fs_title, final_zip_path, (end - start).total_seconds()
+            )
+        else:
+            logging.info(
+                "✅ Exported %s → %s (%.1fs)",
+                fs_title, final_zip_path, (end - start).total_seconds()
+            )
 
         return f"Exported: {fs_title}"
 
     except Exception as e:
-        logging.error(f"❌ Error exporting {fs_title}: {e}")
+        logging.error("❌ Error exporting %s: %s", fs_title, e)
         return None
 
 
 # =========================================================
 # MAIN BACKUP
 # =========================================================
-def export_all_hosted_layers(gis):
+def export_all_hosted_layers(gis, pool, username):
     version = dt.datetime.now().strftime("%d_%b_%Y")
     temp_folder = create_daily_folder(LOCAL_TEMP_FOLDER)
 
     logging.info(f"📁 Temp folder: {temp_folder}")
 
     items = gis.content.search(
-        query=f"owner:{gis.users.me.username} AND type:'Feature Service'",
+        query=f"owner:{username} AND type:'Feature Service'",
         max_items=700
     )
     logging.info(f"Found {len(items)} hosted feature layers.")
@@ -170,21 +516,56 @@ def export_all_hosted_layers(gis):
         logging.info("⚠️ No hosted feature layers found. Exiting.")
         return
 
-    max_threads = min(8, max(2, os.cpu_count() // 2))
-    logging.info(f"🚀 Starting export for {len(items)} layers using {max_threads} threads...")
+    # Read id/title on the main thread while the search results are still
+    # fresh — Item attributes can lazily re-fetch metadata, and we don't want
+    # 700 of those REST calls racing inside the workers.
+    item_specs = [(item.id, item.title) for item in items]
+
+    logging.info(f"🚀 Starting export for {len(items)} layers using {pool._max_workers} threads...")
 
     start_all = dt.datetime.now()
 
-    with parallel_backend("threading", n_jobs=max_threads):
-        results = Parallel(verbose=5)(
-            delayed(export_feature_service)(item.id, item.title, temp_folder, version, gis)
-            for item in items
-        )
+    # One directory listing up-front replaces per-item exists() stats in the
+    # workers.
+    with os.scandir(temp_folder) as it:
+        existing = {entry.name for entry in it}
+    manifest = load_manifest(temp_folder)
+
+    # Downloads are network-bound and re-zips are disk/CPU-bound, so run the
+    # zips on a few dedicated consumer threads fed by the download workers.
+    zip_queue = queue.Queue()
+    zip_failures = []
+    zip_threads = [
+        threading.Thread(target=repackage_worker, args=(zip_queue, zip_failures),
+                         daemon=True)
+        for _ in range(min(4, os.cpu_count() or 4))
+    ]
+    for t in zip_threads:
+        t.start()
+
+    # Futures complete in wall-clock order, so progress is visible as each
+    # layer finishes instead of at the end of the whole batch.
+    futures = [
+        pool.submit(export_feature_service, fs_id, fs_title, temp_folder, version, gis,
+                    zip_queue, existing, manifest)
+        for fs_id, fs_title in item_specs
+    ]
+    results = [fut.result() for fut in as_completed(futures)]
+
+    for _ in zip_threads:
+        zip_queue.put(None)
+    for t in zip_threads:
+        t.join()
 
     end_all = dt.datetime.now()
     duration = end_all - start_all
 
-    exported = sum(1 for r in results if r and r.startswith("Exported"))
+    # Workers report "Exported" when their download lands, so settle the
+    # count against re-zips that failed after being queued.
+    if zip_failures:
+        logging.warning("⚠️ %d queued re-zips failed: %s",
+                        len(zip_failures), ", ".join(zip_failures))
+    exported = sum(1 for r in results if r and r.startswith("Exported")) - len(zip_failures)
     skipped = sum(1 for r in results if r and r.startswith("Skipped"))
     logging.info(f"📊 Summary → Total: {len(items)}, Exported: {exported}, Skipped(existing): {skipped}")
     logging.info(f"⏱️ Total Runtime: {duration}")
@@ -192,7 +573,8 @@ def export_all_hosted_layers(gis):
     print(f"\n✅ Backup Completed. Duration: {duration}")
 
     logging.info("🔍 Validating final backup count...")
-    file_count = len([f for f in os.listdir(temp_folder) if f.lower().endswith(".zip")])
+    with os.scandir(temp_folder) as it:
+        file_count = sum(1 for entry in it if entry.name.lower().endswith(".zip"))
     logging.info(f"📦 Total ZIP files in backup folder: {file_count}")
 
 # =========================================================
@@ -209,21 +591,33 @@ if __name__ == "__main__":
         verify_cert=False
     )
 
-        logging.info(f"✅ Logged in as {gis.users.me.username}")
+        # Each gis.users.me access is a /self REST call — fetch the
+        # username once and reuse it everywhere.
+        me_username = gis.users.me.username
+        logging.info(f"✅ Logged in as {me_username}")
 
         cleanup_old_folders(LOCAL_TEMP_FOLDER, days=15)
 
 
 
-        export_all_hosted_layers(gis)
-        end_run = dt.datetime.now()
-        logging.info(f"✅ AGOL Daily Backup Completed | Duration: {end_run - start_run}")
-        result = cleanup_exported_fgdbs(
-                env_file=".env",
-                log_file="agol_fgdb_cleanup.log",
-                max_items=2000,
-                verify_cert=False
-            )
+        # One shared thread pool for the whole run — spawned once and reused
+        # by both the export loop and the FGDB cleanup.
+        n_threads = tune_thread_count(gis)
+        widen_connection_pool(gis, n_threads)
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            export_all_hosted_layers(gis, pool, me_username)
+            end_run = dt.datetime.now()
+            logging.info(f"✅ AGOL Daily Backup Completed | Duration: {end_run - start_run}")
+            # Safety net only — exports delete their own AGOL item after
+            # download, so this normally finds nothing.
+            result = cleanup_exported_fgdbs(
+                    env_file=".env",
+                    log_file="agol_fgdb_cleanup.log",
+                    max_items=2000,
+                    verify_cert=False,
+                    pool=pool,
+                    username=me_username
+                )
 
         print("FGDB Cleanup Result:", result)
 
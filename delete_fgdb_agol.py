@@ -2,6 +2,10 @@
 agol_cleanup_fgdb.py
 Deletes all File Geodatabase (.zip exports) from ArcGIS Online content.
 Designed to be imported and called from main.py
+
+The backup script deletes each export item right after downloading it, so
+in the main pipeline this acts as a safety net for items that slipped
+through (crashes, failed deletes).
 """
 
 from arcgis.gis import GIS
@@ -9,13 +13,27 @@ import datetime as dt
 import logging
 import os
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _delete_one(item):
+    """Delete a single AGOL item; return a status tuple for aggregation."""
+    try:
+        item.delete(permanent=True)
+        logging.info("🗑️ Deleted: %s (%s)", item.title, item.id)
+        return ("ok", item.id)
+    except Exception as e:
+        logging.warning("⚠️ Could not delete %s: %s", item.title, e)
+        return ("fail", item.id, str(e))
 
 
 def cleanup_exported_fgdbs(
     env_file: str = ".env",
     log_file: str = "agol_fgdb_cleanup.log",
     max_items: int = 2000,
-    verify_cert: bool = False
+    verify_cert: bool = False,
+    pool=None,
+    username: str = None
 ):
     """
     Deletes all File Geodatabase items owned by the authenticated AGOL user.
@@ -30,6 +48,10 @@ def cleanup_exported_fgdbs(
         Max number of FGDB items to search
     verify_cert : bool
         SSL certificate verification flag
+    pool : concurrent.futures.ThreadPoolExecutor, optional
+        Executor to reuse; a thread pool is created if omitted
+    username : str, optional
+        AGOL username, if already known — saves an extra /self REST call
     """
 
     # --- Resolve .env path ---
@@ -41,18 +63,21 @@ def cleanup_exported_fgdbs(
 
     load_dotenv(dotenv_path=env_path, override=True)
 
-    # --- Logging setup ---
-    logging.basicConfig(
-        filename=log_file,
-        filemode="w",
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-    )
-
-    console = logging.StreamHandler()
-    console.setLevel(logging.INFO)
-    console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-    logging.getLogger().addHandler(console)
+    # --- Logging setup (standalone runs only — when called from the backup
+    # pipeline the root logger is already configured, and adding another
+    # console handler would emit every line twice) ---
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(
+            filename=log_file,
+            filemode="w",
+            level=logging.INFO,
+            format="%(asctime)s - %(levelname)s - %(message)s",
+        )
+        console = logging.StreamHandler()
+        console.setLevel(logging.INFO)
+        console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        root.addHandler(console)
 
     # --- Connect to AGOL ---
     gis = GIS(
@@ -63,12 +88,14 @@ def cleanup_exported_fgdbs(
     )
 
     logging.info("🔐 Connecting to ArcGIS Online...")
-    logging.info(f"✅ Logged in as {gis.users.me.username}")
+    if username is None:
+        username = gis.users.me.username
+    logging.info(f"✅ Logged in as {username}")
 
     # --- Search FGDB exports ---
     logging.info("🔍 Searching for File Geodatabase exports...")
     items = gis.content.search(
-        query=f"owner:{gis.users.me.username} AND type:'File Geodatabase'",
+        query=f"owner:{username} AND type:'File Geodatabase'",
         max_items=max_items
     )
 
@@ -78,17 +105,16 @@ def cleanup_exported_fgdbs(
 
     logging.info(f"🧹 Found {len(items)} File Geodatabases. Deleting...")
 
-    deleted = 0
-    failed = 0
-
-    for item in items:
-        try:
-            item.delete(permanent=True)
-            logging.info(f"🗑️ Deleted: {item.title} ({item.id})")
-            deleted += 1
-        except Exception as e:
-            logging.warning(f"⚠️ Could not delete {item.title}: {e}")
-            failed += 1
+    # Each delete is a blocking HTTPS round trip — fan them out over threads
+    # instead of paying one RTT per item serially.
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=32) as own_pool:
+            results = list(own_pool.map(_delete_one, items))
+    else:
+        results = list(pool.map(_delete_one, items))
+
+    deleted = sum(1 for r in results if r[0] == "ok")
+    failed = sum(1 for r in results if r[0] == "fail")
 
     logging.info(f"✅ Cleanup complete → Deleted: {deleted}, Failed: {failed}")
     logging.info(f"🕒 Finished at {dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")